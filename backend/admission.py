@@ -0,0 +1,133 @@
+# backend/admission.py
+"""
+Admission control for the prediction path.
+
+At most `max_in_flight` predictions run at once. Others wait in a priority queue
+for up to `queue_timeout` seconds; when the queue is full, or the expected wait
+is already longer than that, requests are rejected straight away so the client
+can retry later instead of piling up in memory. Doctors who made a prediction
+within the last `session_window` seconds (i.e. are mid-session) go first, and
+background work such as Grad-CAM explanations goes last.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Server is busy, please retry later")
+        self.retry_after = retry_after
+
+
+SESSION_PRIORITY, DEFAULT_PRIORITY, BACKGROUND_PRIORITY = 0, 1, 2
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=4, max_queue=32, queue_timeout=10.0, session_window=600.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.session_window = session_window
+
+        self.in_flight = 0
+        self.waiting = 0
+        self._waiters = []  # heap of (priority, seq, future); cancelled futures are skipped lazily
+        self._seq = itertools.count()
+        self._last_seen = {}  # user id -> time of their last admitted request
+        self._avg_service = 1.0  # moving average of seconds a request holds its slot
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_overloaded = 0
+        self.shed_timeout = 0
+
+    def _priority(self, user_id):
+        last = self._last_seen.get(user_id)
+        if last is not None and time.monotonic() - last < self.session_window:
+            return SESSION_PRIORITY
+        return DEFAULT_PRIORITY
+
+    def _expected_wait(self):
+        return (self.waiting + 1) / self.max_in_flight * self._avg_service
+
+    def _shed(self):
+        return Overloaded(retry_after=max(1, math.ceil(self._expected_wait())))
+
+    async def acquire(self, user_id, priority=None):
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+        else:
+            if self.waiting >= self.max_queue:
+                self.shed_queue_full += 1
+                raise self._shed()
+            if self._expected_wait() > self.queue_timeout:
+                self.shed_overloaded += 1
+                raise self._shed()
+
+            future = asyncio.get_running_loop().create_future()
+            if priority is None:
+                priority = self._priority(user_id)
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            self.waiting += 1
+            self.queued += 1
+            try:
+                # release() hands its slot straight to us, so in_flight is already counted
+                await asyncio.wait_for(future, self.queue_timeout)
+            except asyncio.TimeoutError:
+                if future.done() and not future.cancelled():
+                    self.release(0.0)  # the slot arrived as we timed out; pass it on
+                else:
+                    self.waiting -= 1
+                self.shed_timeout += 1
+                raise self._shed()
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(0.0)
+                else:
+                    self.waiting -= 1
+                raise
+
+        self.admitted += 1
+        if user_id is not None:
+            self._last_seen[user_id] = time.monotonic()
+
+    def release(self, service_time):
+        self._avg_service = 0.9 * self._avg_service + 0.1 * service_time
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.waiting -= 1
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, user_id, priority=None):
+        await self.acquire(user_id, priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        cutoff = time.monotonic() - self.session_window
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_overloaded": self.shed_overloaded,
+            "shed_timeout": self.shed_timeout,
+            "active_sessions": sum(1 for t in self._last_seen.values() if t > cutoff),
+            "avg_service_seconds": round(self._avg_service, 3),
+        }
@@ -0,0 +1,46 @@
+# backend/blobstore.py
+import hashlib
+import os
+import tempfile
+
+
+class BlobStore:
+    """
+    Content-addressed store for uploaded scans on local disk.
+
+    Each blob is saved once under its SHA-256 hash (root/ab/cdef...), so uploading
+    the same image twice costs no extra space and predictions can refer to it by hash.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, contents: bytes) -> str:
+        digest = hashlib.sha256(contents).hexdigest()
+        target = self.path(digest)
+        if os.path.exists(target):
+            return digest
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Write to a temp file first so a crash never leaves a half-written blob behind
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(contents)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest) -> bytes:
+        with open(self.path(digest), "rb") as f:
+            return f.read()
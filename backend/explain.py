@@ -0,0 +1,175 @@
+# backend/explain.py
+"""
+Grad-CAM explanations for past predictions.
+
+Heatmaps are only computed when someone asks for one (/explain/{prediction_id}).
+Requests that arrive close together share one gradient pass, run by a single
+explain worker that takes a lowest-priority admission slot, so explanations
+queue behind predictions instead of competing with them. Rendered overlays are
+cached on disk by image hash, model version and explained class (least recently
+viewed evicted first), so viewing the same explanation again costs nothing.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .admission import BACKGROUND_PRIORITY
+
+# VGG16's last conv block; other backbones fall back to their last 4-D (conv) output
+VGG16_LAST_CONV = "block5_conv3"
+
+_grad_models = {}
+
+
+def last_conv_layer(model):
+    names = [layer.name for layer in model.layers]
+    if VGG16_LAST_CONV in names:
+        return model.get_layer(VGG16_LAST_CONV)
+    for layer in reversed(model.layers):
+        if len(layer.output.shape) == 4:
+            return layer
+    raise ValueError("Model has no convolutional layer to explain")
+
+
+def gradcam(model, images, class_idxs):
+    """Grad-CAM heatmaps in [0, 1], one (h, w) map per image, for the given class of each image."""
+    import tensorflow as tf
+
+    grad_model = _grad_models.get(id(model))
+    if grad_model is None:
+        grad_model = tf.keras.models.Model(model.inputs, [last_conv_layer(model).output, model.output])
+        _grad_models[id(model)] = grad_model
+
+    images = tf.convert_to_tensor(images, dtype=tf.float32)
+    with tf.GradientTape() as tape:
+        conv_out, preds = grad_model(images, training=False)
+        scores = tf.gather(preds, tf.constant(class_idxs), axis=1, batch_dims=1)
+    grads = tape.gradient(scores, conv_out)
+
+    weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+    cams = tf.nn.relu(tf.reduce_sum(weights * conv_out, axis=-1)).numpy()
+    peaks = cams.reshape(len(cams), -1).max(axis=1).reshape(-1, 1, 1)
+    return cams / np.maximum(peaks, 1e-8)
+
+
+def render_overlay(image, heatmap, alpha=0.4):
+    """Blend a heatmap over the preprocessed (RGB, [0, 1]) scan and encode it as PNG."""
+    base = (image * 255).astype("uint8")
+    heat = cv2.resize(heatmap.astype("float32"), (base.shape[1], base.shape[0]))
+    heat = cv2.applyColorMap((heat * 255).astype("uint8"), cv2.COLORMAP_JET)
+    overlay = cv2.addWeighted(cv2.cvtColor(base, cv2.COLOR_RGB2BGR), 1 - alpha, heat, alpha, 0)
+    ok, png = cv2.imencode(".png", overlay)
+    if not ok:
+        raise RuntimeError("Could not encode explanation image")
+    return png.tobytes()
+
+
+class ExplanationCache:
+    def __init__(self, root, max_bytes=500 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, image_sha256, model_version, label):
+        return os.path.join(self.root, model_version, f"{image_sha256}-{label}.png")
+
+    def get(self, *key):
+        path = self.path(*key)
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mtime doubles as "last viewed" for eviction
+        return png
+
+    def put(self, png, *key):
+        path = self.path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".png"):
+                    stat = os.stat(os.path.join(dirpath, name))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(dirpath, name)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class ExplanationBatcher:
+    """
+    Gathers explanation requests for up to `max_wait_ms` (or `max_batch` items) and
+    runs them as one gradient pass on a single worker thread, holding a background
+    slot from `admission` if given. `heatmap_fn(images, class_idxs)` does the actual
+    work, either in-process or on the inference server.
+    """
+
+    def __init__(self, heatmap_fn, admission=None, max_batch=8, max_wait_ms=20):
+        self.heatmap_fn = heatmap_fn
+        self.admission = admission
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []
+        self._timer = None
+        self._running = {}  # cache key -> future, so concurrent views of one scan share the work
+
+    async def explain(self, key, image, class_idx):
+        future = self._running.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._running[key] = future
+            self._pending.append((key, image, class_idx, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    def _compute(self, images, class_idxs):
+        heatmaps = self.heatmap_fn(images, class_idxs)
+        return [render_overlay(image, heatmap) for image, heatmap in zip(images, heatmaps)]
+
+    async def _run(self, batch):
+        images = np.stack([image for _, image, _, _ in batch])
+        class_idxs = [class_idx for _, _, class_idx, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            if self.admission is None:
+                pngs = await loop.run_in_executor(self._executor, self._compute, images, class_idxs)
+            else:
+                async with self.admission.slot(None, priority=BACKGROUND_PRIORITY):
+                    pngs = await loop.run_in_executor(self._executor, self._compute, images, class_idxs)
+        except Exception as e:
+            for key, _, _, future in batch:
+                self._running.pop(key, None)
+                future.set_exception(e)
+            return
+        for (key, _, _, future), png in zip(batch, pngs):
+            self._running.pop(key, None)
+            future.set_result(png)
@@ -0,0 +1,134 @@
+# backend/export.py
+"""
+Streaming export of predictions (joined with the doctor who made them).
+
+Rows are read in fixed-size chunks (keyset pagination on the prediction id) and
+encoded one chunk at a time, so memory stays flat no matter how many rows match.
+"""
+import csv
+import io
+
+from sqlalchemy import select
+
+from . import models, database
+
+EXPORT_COLUMNS = [
+    models.Prediction.id,
+    models.Prediction.created_at,
+    models.User.username.label("doctor"),
+    models.Prediction.patient_name,
+    models.Prediction.patient_age,
+    models.Prediction.filename,
+    models.Prediction.image_sha256,
+    models.Prediction.model_version,
+    models.Prediction.label,
+    models.Prediction.confidence,
+]
+COLUMN_NAMES = [col.key for col in EXPORT_COLUMNS]
+
+
+def build_query(start=None, end=None, label=None, doctor=None):
+    query = select(*EXPORT_COLUMNS).join(models.User, models.Prediction.user_id == models.User.id)
+    if start is not None:
+        query = query.where(models.Prediction.created_at >= start)
+    if end is not None:
+        query = query.where(models.Prediction.created_at < end)
+    if label is not None:
+        query = query.where(models.Prediction.label == label)
+    if doctor is not None:
+        query = query.where(models.User.username == doctor)
+    return query.order_by(models.Prediction.id)
+
+
+def iter_chunks(query, chunk_size):
+    """
+    Keyset pagination on predictions.id with a short connection per chunk. Holding one
+    SQLite read transaction for the whole download would lock out every write meanwhile.
+    """
+    last_id = 0
+    while True:
+        with database.engine.connect() as conn:
+            rows = conn.execute(query.where(models.Prediction.id > last_id).limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def stream_csv(query, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for rows in iter_chunks(query, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink:
+    """Minimal writable file for pyarrow that hands back whatever was written since last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(query, chunk_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+        ("doctor", pa.string()),
+        ("patient_name", pa.string()),
+        ("patient_age", pa.int64()),
+        ("filename", pa.string()),
+        ("image_sha256", pa.string()),
+        ("model_version", pa.string()),
+        ("label", pa.string()),
+        ("confidence", pa.float64()),
+    ])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # Each chunk becomes one row group, flushed to the client as soon as it's written
+        for rows in iter_chunks(query, chunk_size):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
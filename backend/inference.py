@@ -0,0 +1,198 @@
+# backend/inference.py
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+CLASSES = ["Healthy", "Parkinson"]
+IMG_SIZE = (224, 224)
+
+
+def preprocess_image(contents: bytes) -> np.ndarray:
+    """Decode an uploaded scan into the (224, 224, 3) float32 [0, 1] array the model expects."""
+    nparr = np.frombuffer(contents, np.uint8)
+    try:
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    except cv2.error:
+        image = None
+    if image is None:
+        raise ValueError("Could not decode image")
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image = cv2.resize(image, IMG_SIZE)
+    return image.astype("float32") / 255.0
+
+
+def decode_predictions(preds):
+    """Turn a batch of softmax outputs into (label, confidence %) pairs."""
+    idxs = np.argmax(preds, axis=1)
+    return [(CLASSES[i], float(p[i] * 100)) for i, p in zip(idxs, preds)]
+
+
+def model_version(model_path: str) -> str:
+    """Short, stable id for a saved model: file name plus the start of its content hash."""
+    sha = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return f"{name}-{sha.hexdigest()[:12]}"
+
+
+# --- SERVING PROFILE ---
+# Written by `python -m backend.tune`, applied by the API and the inference server at startup.
+
+CALL_STYLES = ("predict", "call", "tf_function")
+
+
+def load_serving_profile(path, model_path):
+    """The tuned profile for `model_path`, or None if there is none or it was tuned for another model."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    expected = model_version(model_path)
+    if profile.get("model_version") != expected:
+        print(f"[WARN] Ignoring serving profile {path}: tuned for {profile.get('model_version')}, "
+              f"serving {expected}. Re-run `python -m backend.tune`.")
+        return None
+    return profile
+
+
+def configure_threads(intra_op_threads=0, inter_op_threads=0):
+    """Size TensorFlow's thread pools (0 = TensorFlow's default). Only works before TF runs anything."""
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        print(f"[WARN] Could not set TensorFlow thread counts: {e}")
+
+
+def make_predict_fn(model, call_style="predict"):
+    """Wrap a Keras model in the chosen call style; every style returns a NumPy array."""
+    import tensorflow as tf
+
+    if call_style == "predict":
+        return lambda x: model.predict(x, verbose=0)
+    if call_style == "call":
+        return lambda x: model(x, training=False).numpy()
+    if call_style == "tf_function":
+        # Fixed signature so any batch size reuses the same traced graph
+        fn = tf.function(lambda x: model(x, training=False),
+                         input_signature=[tf.TensorSpec([None, IMG_SIZE[1], IMG_SIZE[0], 3], tf.float32)])
+        return lambda x: fn(tf.convert_to_tensor(x, dtype=tf.float32)).numpy()
+    raise ValueError(f"Unknown call style '{call_style}'. Choose one of {CALL_STYLES}.")
+
+
+# --- INFERENCE SERVER PROTOCOL ---
+# Messages over the Unix socket are a 4-byte big-endian header length, a JSON header,
+# then `nbytes` of raw array data. See backend/inference_server.py.
+
+def send_message(sock, header: dict, payload: bytes = b""):
+    header = dict(header, nbytes=len(payload))
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(raw)) + raw + payload)
+
+
+class ConnectionClosed(ConnectionError):
+    """The peer closed the connection before sending any part of a message."""
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    total = n
+    while n:
+        got = sock.recv_into(view, n)
+        if not got:
+            if n == total:
+                raise ConnectionClosed("inference server closed the connection")
+            raise ConnectionError("inference server closed the connection mid-message")
+        view = view[got:]
+        n -= got
+    return bytes(buf)
+
+
+def recv_message(sock):
+    (length,) = struct.unpack(">I", _recv_exact(sock, 4))
+    header = json.loads(_recv_exact(sock, length))
+    payload = _recv_exact(sock, header["nbytes"]) if header["nbytes"] else b""
+    return header, payload
+
+
+def send_array(sock, header: dict, array: np.ndarray):
+    array = np.ascontiguousarray(array)
+    send_message(sock, dict(header, shape=list(array.shape), dtype=str(array.dtype)), array.tobytes())
+
+
+def payload_array(header, payload):
+    return np.frombuffer(payload, dtype=header["dtype"]).reshape(header["shape"])
+
+
+class RemoteModel:
+    """
+    Stand-in for a Keras model that forwards preprocessed batches to the shared
+    inference server, so API workers never import TensorFlow or hold a model copy.
+    """
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.version = self._call({"op": "info"})[0]["model_version"]
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _call(self, header, array=None):
+        # One persistent connection per thread. A reused connection may have gone stale
+        # (server restarted), which shows up as a failed send or EOF before any reply:
+        # only then reconnect and resend once. Timeouts are never retried, since the
+        # server may still be working on the request.
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            reused = sock is not None
+            if not reused:
+                sock = self._local.sock = self._connect()
+            try:
+                if array is None:
+                    send_message(sock, header)
+                else:
+                    send_array(sock, header, array)
+            except OSError as e:
+                self._drop(sock)
+                if isinstance(e, ConnectionError) and reused and not attempt:
+                    continue
+                raise
+            try:
+                reply, payload = recv_message(sock)
+            except OSError as e:
+                self._drop(sock)
+                if isinstance(e, ConnectionClosed) and reused and not attempt:
+                    continue
+                raise
+            break
+        if not reply.get("ok"):
+            raise RuntimeError(f"inference server error: {reply.get('error')}")
+        return reply, payload
+
+    def _drop(self, sock):
+        sock.close()
+        self._local.sock = None
+
+    def predict(self, x, **kwargs):
+        reply, payload = self._call({"op": "predict"}, np.asarray(x, dtype="float32"))
+        return payload_array(reply, payload)
+
+    def gradcam(self, images, class_idxs):
+        header = {"op": "gradcam", "class_idxs": [int(i) for i in class_idxs]}
+        reply, payload = self._call(header, np.asarray(images, dtype="float32"))
+        return payload_array(reply, payload)
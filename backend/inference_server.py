@@ -0,0 +1,178 @@
+# backend/inference_server.py
+"""
+Shared inference server for multi-worker deployments.
+
+    python -m backend.inference_server --socket /tmp/parkinsons-inference.sock
+    PARKINSONS_INFERENCE_SOCKET=/tmp/parkinsons-inference.sock uvicorn backend.main:app --workers 4
+
+This process owns the only copy of the model and a single, explicitly sized
+TensorFlow thread pool. API workers send it preprocessed tensors over a Unix
+socket (see RemoteModel in backend/inference.py). Requests that arrive close
+together are merged into one batch before they hit the model.
+"""
+import argparse
+import itertools
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from .explain import gradcam
+from .inference import (recv_message, send_message, send_array, payload_array, model_version,
+                        load_serving_profile, configure_threads, make_predict_fn)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOCKET = "/tmp/parkinsons-inference.sock"
+DEFAULT_PROFILE = os.path.join(BASE_DIR, "model", "serving_profile.json")
+
+
+class Batcher:
+    """
+    Collects concurrent requests into batches and runs them on one inference thread.
+    Background jobs (Grad-CAM) run on the same thread, but only when no prediction
+    is waiting, so they never add a second compute stream next to predictions.
+    """
+
+    PREDICT, BACKGROUND = 0, 1
+
+    def __init__(self, predict_fn, max_batch=16, max_wait_ms=5):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        threading.Thread(target=self._run, name="inference", daemon=True).start()
+
+    def submit(self, batch: np.ndarray) -> Future:
+        future = Future()
+        self._queue.put((self.PREDICT, next(self._seq), batch, future))
+        return future
+
+    def submit_background(self, func) -> Future:
+        future = Future()
+        self._queue.put((self.BACKGROUND, next(self._seq), func, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item[0] == self.BACKGROUND:
+                _, _, func, future = item
+                try:
+                    future.set_result(func())
+                except Exception as e:
+                    future.set_exception(e)
+                continue
+
+            pending = [item]
+            size = len(item[2])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item[0] == self.BACKGROUND:
+                    self._queue.put(item)  # keeps its place: same priority and sequence number
+                    break
+                pending.append(item)
+                size += len(item[2])
+
+            try:
+                inputs = np.concatenate([batch for _, _, batch, _ in pending])
+                preds = np.asarray(self.predict_fn(inputs))
+            except Exception as e:
+                for _, _, _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for _, _, batch, future in pending:
+                future.set_result(preds[start:start + len(batch)])
+                start += len(batch)
+
+
+class InferenceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Clients keep their connection open and send many requests over it
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                if header["op"] == "info":
+                    send_message(self.request, {"ok": True, "model_version": self.server.model_version})
+                elif header["op"] == "predict":
+                    preds = self.server.batcher.submit(payload_array(header, payload)).result()
+                    send_array(self.request, {"ok": True}, preds)
+                elif header["op"] == "gradcam":
+                    # Runs on the inference thread, behind any waiting predictions
+                    images = payload_array(header, payload)
+                    heatmaps = self.server.batcher.submit_background(
+                        lambda: gradcam(self.server.model, images, header["class_idxs"])).result()
+                    send_array(self.request, {"ok": True}, heatmaps.astype("float32"))
+                else:
+                    send_message(self.request, {"ok": False, "error": f"unknown op {header['op']!r}"})
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_message(self.request, {"ok": False, "error": str(e)})
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, predict_fn, version, max_batch=16, max_wait_ms=5, model=None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, InferenceHandler)
+        self.model = model
+        self.model_version = version
+        self.batcher = Batcher(predict_fn, max_batch, max_wait_ms)
+
+
+def load_model(model_path, intra_op_threads=0, inter_op_threads=0):
+    # Must happen before TensorFlow runs anything; 0 keeps TensorFlow's default
+    configure_threads(intra_op_threads, inter_op_threads)
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Parkinson's model to local API workers.")
+    parser.add_argument("--socket", default=os.getenv("PARKINSONS_INFERENCE_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--model", default=os.getenv(
+        "PARKINSONS_MODEL_PATH", os.path.join(BASE_DIR, "model", "parkinsons_detector.keras")))
+    parser.add_argument("--profile", default=os.getenv("PARKINSONS_SERVING_PROFILE", DEFAULT_PROFILE),
+                        help="serving profile from `python -m backend.tune`; flags below override it")
+    parser.add_argument("--intra-op-threads", type=int)
+    parser.add_argument("--inter-op-threads", type=int)
+    parser.add_argument("--call-style")
+    parser.add_argument("--max-batch", type=int)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    profile = load_serving_profile(args.profile, args.model) or {}
+    intra = args.intra_op_threads if args.intra_op_threads is not None else profile.get("intra_op_threads", 0)
+    inter = args.inter_op_threads if args.inter_op_threads is not None else profile.get("inter_op_threads", 0)
+    call_style = args.call_style or profile.get("call_style", "call")
+    max_batch = args.max_batch or profile.get("max_batch", 16)
+
+    model = load_model(args.model, intra, inter)
+    server = InferenceServer(args.socket, make_predict_fn(model, call_style), model_version(args.model),
+                             max_batch, args.max_wait_ms, model=model)
+    print(f"[INFO] Inference server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(args.socket)
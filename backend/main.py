@@ -1,36 +1,74 @@
 # backend/main.py
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func  # <--- Imported func for counting stats
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from typing import Optional
 import numpy as np
-import cv2
-from tensorflow.keras.models import load_model
 from . import models, database
-import tensorflow as tf
+from .blobstore import BlobStore
+from .inference import (CLASSES, preprocess_image, model_version, RemoteModel,
+                        load_serving_profile, configure_threads, make_predict_fn)
+from .profiling import RequestProfiler, ProfilingMiddleware
+from . import export
+from .admission import AdmissionController, Overloaded
+from .explain import ExplanationBatcher, ExplanationCache, gradcam
 
 # --- CONFIGURATION ---
 # MODEL_PATH = r"C:\Users\manav\Downloads\Parkinson-s-Disease-Classifier-master\Parkinson-s-Disease-Classifier-master\model\parkinsons_detector.model"
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_PATH = os.path.join(BASE_DIR, "model", "parkinsons_detector.keras")
+# Any model saved by model/main.py works here (VGG16 or one of the compact backbones),
+# they all take the same 224x224 [0, 1] input. Pick one with PARKINSONS_MODEL_PATH.
+MODEL_PATH = os.getenv("PARKINSONS_MODEL_PATH", os.path.join(BASE_DIR, "model", "parkinsons_detector.keras"))
 
+# Uploaded scans are archived here by content hash so they can be re-scored later
+SCAN_STORE_PATH = os.getenv("PARKINSONS_SCAN_STORE", os.path.join(BASE_DIR, "scan_store"))
+
+# When set, inference goes to the shared server (backend/inference_server.py) on this
+# Unix socket and this worker never imports TensorFlow or loads its own model copy.
+INFERENCE_SOCKET = os.getenv("PARKINSONS_INFERENCE_SOCKET")
+
+# Thread counts and call style picked by `python -m backend.tune`, applied at startup if present
+SERVING_PROFILE_PATH = os.getenv("PARKINSONS_SERVING_PROFILE", os.path.join(BASE_DIR, "model", "serving_profile.json"))
+
+# Rendered Grad-CAM overlays, keyed by model version and image hash
+EXPLANATION_CACHE_PATH = os.getenv("PARKINSONS_EXPLANATION_CACHE", os.path.join(BASE_DIR, "explanations"))
+EXPLANATION_CACHE_MB = int(os.getenv("PARKINSONS_EXPLANATION_CACHE_MB", 500))
+
+# Admission control for /predict (see backend/admission.py)
+MAX_IN_FLIGHT = int(os.getenv("PARKINSONS_MAX_IN_FLIGHT", os.cpu_count() or 1))
+MAX_QUEUE = int(os.getenv("PARKINSONS_MAX_QUEUE", 32))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("PARKINSONS_QUEUE_TIMEOUT", 10))
+
+# Profiles captured through /admin/profiling end up here (oldest are deleted first)
+PROFILE_DIR = os.getenv("PARKINSONS_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
 
-CLASSES = ["Healthy", "Parkinson"]
 SECRET_KEY = "my_super_secret_key_for_final_year_project"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 app = FastAPI()
+profiler = RequestProfiler(PROFILE_DIR)
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUE, QUEUE_TIMEOUT_SECONDS)
+# Only routes that hand their blocking work to profiler.run_sync can produce a cProfile trace
+app.add_middleware(ProfilingMiddleware, profiler=profiler, paths=("/predict", "/explain/"))
 models.Base.metadata.create_all(bind=database.engine)
+database.add_missing_columns()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 model = None
+model_id = None
+predict_fn = None
+explainer = None
+scan_store = BlobStore(SCAN_STORE_PATH)
+explanation_cache = ExplanationCache(EXPLANATION_CACHE_PATH, EXPLANATION_CACHE_MB * 1024 * 1024)
 
 
 # --- HELPERS ---
@@ -49,7 +87,8 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_token_username(token: str = Depends(oauth2_scheme)):
+    """Username from a valid JWT, checked without touching the database."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -62,18 +101,49 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return username
+
+
+def get_current_user(username: str = Depends(get_token_username), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
+def get_current_admin(current_user: models.User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized. Admin access required.")
+    return current_user
+
+
 @app.on_event("startup")
 def load_ai_model():
-    global model
+    global model, model_id, predict_fn, explainer
     try:
+        if INFERENCE_SOCKET:
+            model = RemoteModel(INFERENCE_SOCKET)
+            model_id = model.version
+            predict_fn = model.predict
+            explainer = ExplanationBatcher(model.gradcam, admission)
+            print(f"[INFO] Using inference server at {INFERENCE_SOCKET}")
+            return
+
+        profile = load_serving_profile(SERVING_PROFILE_PATH, MODEL_PATH) or {}
+        if profile:
+            configure_threads(profile["intra_op_threads"], profile["inter_op_threads"])
+            print(f"[INFO] Applied serving profile {SERVING_PROFILE_PATH}")
+
+        import tensorflow as tf
         # model = load_model(MODEL_PATH)
         model = tf.keras.models.load_model(MODEL_PATH)
+        model_id = model_version(MODEL_PATH)
+        predict_fn = make_predict_fn(model, profile.get("call_style", "predict"))
+        explainer = ExplanationBatcher(lambda images, class_idxs: gradcam(model, images, class_idxs), admission)
 
         print("[INFO] Model loaded successfully!")
     except Exception as e:
@@ -147,40 +217,101 @@ def get_prediction_history(current_user: models.User = Depends(get_current_user)
     return current_user.predictions
 
 
+def lookup_user_id(username):
+    with database.SessionLocal() as db:
+        return db.query(models.User.id).filter(models.User.username == username).scalar()
+
+
+def save_record(record):
+    with database.SessionLocal() as db:
+        db.add(record)
+        db.commit()
+
+
 @app.post("/predict")
 async def predict(
         patient_name: str = Form(...),
         patient_age: int = Form(...),
         file: UploadFile = File(...),
-        current_user: models.User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        username: str = Depends(get_token_username)
 ):
+    # No DB connection is held while queued for admission: look the user up in a short
+    # session now, and open another one only to store the result. Both run in the
+    # threadpool so a SQLite lock wait never blocks the event loop.
+    user_id = await profiler.run_sync(lookup_user_id, username)
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+    # Decoding and inference only start once admitted; over budget we answer 503 straight away
+    try:
+        async with admission.slot(user_id):
+            contents = await file.read()
+            try:
+                image = np.expand_dims(await profiler.run_sync(preprocess_image, contents), axis=0)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Could not read the uploaded image")
+            # Only archive scans that actually decode
+            image_sha256 = await profiler.run_sync(scan_store.put, contents)
+
+            # Run inference off the event loop so other requests keep being served meanwhile
+            preds = await profiler.run_sync(predict_fn, image)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-    contents = await file.read()
-    nparr = np.frombuffer(contents, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image = cv2.resize(image, (224, 224))
-    image = image.astype("float32") / 255.0
-    image = np.expand_dims(image, axis=0)
-
-    preds = model.predict(image)
     idx = np.argmax(preds, axis=1)[0]
     label = CLASSES[idx]
     confidence = float(preds[0][idx] * 100)
 
     db_record = models.Prediction(
-        user_id=current_user.id,
+        user_id=user_id,
         patient_name=patient_name,
         patient_age=patient_age,
         filename=file.filename,
+        image_sha256=image_sha256,
+        model_version=model_id,
         label=label,
         confidence=confidence
     )
-    db.add(db_record)
-    db.commit()
+    await profiler.run_sync(save_record, db_record)
     return {"patient": patient_name, "prediction": label, "confidence": round(confidence, 2)}
 
+def load_user_and_prediction(username, prediction_id):
+    with database.SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.username == username).first()
+        prediction = db.query(models.Prediction).filter(models.Prediction.id == prediction_id).first()
+    return user, prediction
+
+
+@app.get("/explain/{prediction_id}")
+async def explain_prediction(prediction_id: int, username: str = Depends(get_token_username)):
+    # Short session in the threadpool: nothing below holds a DB connection while waiting
+    # on the explainer, and a SQLite lock wait doesn't block the event loop
+    user, prediction = await profiler.run_sync(load_user_and_prediction, username, prediction_id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
+                            headers={"WWW-Authenticate": "Bearer"})
+    # Doctors can only see their own patients' scans
+    if prediction is None or (prediction.user_id != user.id and user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    if not prediction.image_sha256 or not await profiler.run_sync(scan_store.exists, prediction.image_sha256):
+        raise HTTPException(status_code=404, detail="No archived scan for this prediction")
+    if explainer is None:
+        raise HTTPException(status_code=503, detail="Model is not loaded")
+
+    headers = {"X-Model-Version": model_id}
+    key = (prediction.image_sha256, model_id, prediction.label)
+    png = await profiler.run_sync(explanation_cache.get, *key)
+    if png is None:
+        image = await profiler.run_sync(lambda: preprocess_image(scan_store.get(prediction.image_sha256)))
+        try:
+            png = await explainer.explain(key, image, CLASSES.index(prediction.label))
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        await profiler.run_sync(explanation_cache.put, png, *key)
+    return Response(content=png, media_type="image/png", headers=headers)
+
+
 # --- NEW ADMIN ROUTES ---
 
 @app.get("/admin/stats")
@@ -200,4 +331,72 @@ def get_system_stats(current_user: models.User = Depends(get_current_user), db:
         "total_predictions": total_predictions,
         "parkinson_cases": parkinson_count,
         "healthy_cases": healthy_count
-    }
\ No newline at end of file
+    }
+
+
+
+@app.get("/admin/admission")
+def get_admission_stats(current_user: models.User = Depends(get_current_admin)):
+    return admission.stats()
+
+
+@app.get("/admin/export")
+def export_predictions(
+        format: str = "csv",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        label: Optional[str] = None,
+        doctor: Optional[str] = None,
+        chunk_size: int = 5000,
+        current_user: models.User = Depends(get_current_admin)
+):
+    if format not in ("csv", "parquet"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'parquet'")
+    if not 1 <= chunk_size <= 100_000:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 100000")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed")
+
+    query = export.build_query(start=start, end=end, label=label, doctor=doctor)
+    # A plain generator is iterated in the threadpool, so long exports don't block other requests
+    if format == "csv":
+        body, media_type = export.stream_csv(query, chunk_size), "text/csv"
+    else:
+        body, media_type = export.stream_parquet(query, chunk_size), "application/vnd.apache.parquet"
+    filename = f"predictions-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+# --- PROFILING (ADMIN) ---
+
+@app.get("/admin/profiling")
+def get_profiling_settings(current_user: models.User = Depends(get_current_admin)):
+    return profiler.settings()
+
+
+@app.put("/admin/profiling")
+def update_profiling_settings(
+        enabled: bool = Form(...),
+        sample_rate: float = Form(0.01),
+        mode: str = Form("cprofile"),
+        current_user: models.User = Depends(get_current_admin)
+):
+    try:
+        profiler.configure(enabled, sample_rate, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return profiler.settings()
+
+
+@app.get("/admin/profiles")
+def list_profiles(current_user: models.User = Depends(get_current_admin)):
+    return profiler.list_traces()
+
+
+@app.get("/admin/profiles/{name}")
+def download_profile(name: str, current_user: models.User = Depends(get_current_admin)):
+    path = profiler.trace_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
@@ -1,5 +1,5 @@
 # backend/models.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -25,10 +25,27 @@ class Prediction(Base):
     patient_name = Column(String)
     patient_age = Column(Integer)
     filename = Column(String)
+    # SHA-256 of the uploaded scan in the blob store (see backend/blobstore.py)
+    image_sha256 = Column(String, index=True)
+    model_version = Column(String)
     label = Column(String)
     confidence = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
     owner = relationship("User", back_populates="predictions")
+    rescores = relationship("PredictionRescore", back_populates="prediction")
+
+
+class PredictionRescore(Base):
+    """Result of re-running an archived scan through another model version (backend/rescore.py)."""
+    __tablename__ = "prediction_rescores"
+    __table_args__ = (UniqueConstraint("prediction_id", "model_version"),)
+    id = Column(Integer, primary_key=True, index=True)
+    prediction_id = Column(Integer, ForeignKey("predictions.id"), index=True)
+    model_version = Column(String, index=True)
+    label = Column(String)
+    confidence = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    prediction = relationship("Prediction", back_populates="rescores")
 
 
 # gaurang code
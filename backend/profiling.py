@@ -0,0 +1,206 @@
+# backend/profiling.py
+"""
+On-demand request profiling.
+
+Admins switch it on at runtime (see the /admin/profiling routes). The settings
+live in a small JSON file in the profile directory, so every uvicorn worker
+picks them up. A sampled request is captured either with cProfile or with the
+TensorFlow profiler, and the result is written to a rotating directory of at
+most `max_files` traces. When profiling is off the middleware does one clock
+read per request (to re-check the shared settings about once a second).
+
+cProfile only records the blocking work a route hands to `run_sync`, inside the
+worker thread that runs it, so concurrent requests on the event loop stay out of
+the stacks and the loop itself is never blocked by a capture. Sync routes and
+streaming bodies run in FastAPI's own threadpool where that can't reach, so the
+middleware only samples the paths it is given (/predict and /explain in
+backend/main.py); other requests never take the capture lock.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+
+MODES = ("cprofile", "tensorflow")
+SETTINGS_FILE = "settings.json"
+SETTINGS_CHECK_INTERVAL = 1.0  # seconds between re-reading the shared settings file
+
+# The cProfile.Profile collecting the current request's work, if it was sampled
+_capture = contextvars.ContextVar("profiling_capture", default=None)
+
+
+class RequestProfiler:
+    def __init__(self, directory, max_files=50):
+        self.directory = directory
+        self.max_files = max_files
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.mode = "cprofile"
+        # cProfile and the TF profiler can each only run one capture at a time
+        self._lock = threading.Lock()
+        self._settings_path = os.path.join(directory, SETTINGS_FILE)
+        self._settings_mtime = None
+        self._next_check = 0.0
+
+    def configure(self, enabled, sample_rate, mode):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._settings_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"enabled": enabled, "sample_rate": sample_rate, "mode": mode}, f)
+        os.replace(tmp_path, self._settings_path)
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Pick up settings written by any worker (checked at most once per interval)."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + SETTINGS_CHECK_INTERVAL
+        try:
+            mtime = os.stat(self._settings_path).st_mtime_ns
+        except FileNotFoundError:
+            self.enabled = False
+            return
+        if mtime == self._settings_mtime and not force:
+            return
+        try:
+            with open(self._settings_path) as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._settings_mtime = mtime
+        self.sample_rate = settings["sample_rate"]
+        self.mode = settings["mode"]
+        self.enabled = settings["enabled"]
+
+    def settings(self):
+        self.refresh(force=True)
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "mode": self.mode,
+            "max_files": self.max_files,
+        }
+
+    # --- capturing ---
+
+    def start(self, label):
+        """Begin a capture for this request, or return None if it isn't sampled."""
+        if random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+            return None
+        name = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}-{_slug(label)}"
+        try:
+            if self.mode == "tensorflow":
+                # The TF profiler is process-wide: it also sees other requests' TF work
+                import tensorflow as tf
+                logdir = os.path.join(self.directory, name)
+                tf.profiler.experimental.start(logdir)
+                return ("tensorflow", name, logdir)
+
+            profile = cProfile.Profile()
+            token = _capture.set(profile)
+            return ("cprofile", name, (profile, token))
+        except Exception:
+            self._lock.release()
+            raise
+
+    def stop(self, capture):
+        mode, name, state = capture
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if mode == "tensorflow":
+                import tensorflow as tf
+                tf.profiler.experimental.stop()
+                archive_trace_dir(state)
+            else:
+                profile, token = state
+                _capture.reset(token)
+                if profile.getstats():
+                    profile.dump_stats(os.path.join(self.directory, name + ".prof"))
+        finally:
+            self._lock.release()
+        self._rotate()
+
+    async def run_sync(self, func, *args):
+        """
+        Run blocking work (decoding, inference) in the threadpool. If the request is
+        being captured with cProfile, the work is profiled inside that worker thread.
+        """
+        profile = _capture.get()
+        if profile is None:
+            return await run_in_threadpool(func, *args)
+
+        def profiled():
+            profile.enable()
+            try:
+                return func(*args)
+            finally:
+                profile.disable()
+        return await run_in_threadpool(profiled)
+
+    # --- stored traces ---
+
+    def list_traces(self):
+        if not os.path.isdir(self.directory):
+            return []
+        traces = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith((".prof", ".zip")):
+                stat = entry.stat()
+                traces.append({"name": entry.name, "size": stat.st_size, "created": stat.st_mtime})
+        return sorted(traces, key=lambda t: t["created"], reverse=True)
+
+    def trace_path(self, name):
+        """Path of a stored trace, or None if `name` isn't one of ours."""
+        if name not in {t["name"] for t in self.list_traces()}:
+            return None
+        return os.path.join(self.directory, name)
+
+    def _rotate(self):
+        for trace in self.list_traces()[self.max_files:]:
+            os.remove(os.path.join(self.directory, trace["name"]))
+
+
+class ProfilingMiddleware:
+    """Plain ASGI middleware so that the disabled path adds almost no work per request."""
+
+    def __init__(self, app, profiler: RequestProfiler, paths=()):
+        self.app = app
+        self.profiler = profiler
+        # Path prefixes of the routes whose work goes through RequestProfiler.run_sync
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        self.profiler.refresh()
+        if not self.profiler.enabled or scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+
+        capture = self.profiler.start(f"{scope['method']} {scope['path']}")
+        if capture is None:
+            return await self.app(scope, receive, send)
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            self.profiler.stop(capture)
+
+
+def archive_trace_dir(path):
+    """Zip a TensorFlow trace directory into `<path>.zip` so it can be listed and downloaded."""
+    shutil.make_archive(path, "zip", path)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_")[:60]
@@ -0,0 +1,123 @@
+# backend/rescore.py
+"""
+Re-score archived scans under another model version.
+
+    python -m backend.rescore --model model/parkinsons_detector_mobilenetv3.keras
+
+Every prediction with an archived scan is run through the chosen model in large
+batches and the result is written to `prediction_rescores` next to the original
+label, so a new model can be audited against real history. Runs are resumable:
+predictions already scored under the same model version are skipped.
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+from . import models, database
+from .blobstore import BlobStore
+from .inference import preprocess_image, decode_predictions, model_version
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pending_batch(db, version, after_id, batch_size):
+    """Next `batch_size` archived predictions (by id) that have no rescore for `version` yet."""
+    already_done = db.query(models.PredictionRescore.prediction_id).filter(
+        models.PredictionRescore.model_version == version
+    )
+    return (
+        db.query(models.Prediction.id, models.Prediction.image_sha256, models.Prediction.label)
+        .filter(models.Prediction.id > after_id)
+        .filter(models.Prediction.image_sha256.isnot(None))
+        .filter(models.Prediction.id.notin_(already_done))
+        .order_by(models.Prediction.id)
+        .limit(batch_size)
+        .all()
+    )
+
+
+def load_scan(store, digest):
+    """Decoded scan, or None if the blob can't be read or decoded (counted, not fatal)."""
+    try:
+        return preprocess_image(store.get(digest))
+    except (OSError, ValueError):
+        return None
+
+
+def rescore(model_path, store, version=None, batch_size=256, workers=4):
+    model = tf.keras.models.load_model(model_path)
+    version = version or model_version(model_path)
+    print(f"[INFO] re-scoring archived scans with {version}...")
+
+    db = database.SessionLocal()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    scored = agreed = missing = unreadable = 0
+    last_id = 0
+    try:
+        while True:
+            # Keyset pagination keeps memory flat and lets us commit between batches
+            rows = pending_batch(db, version, last_id, batch_size)
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            # Duplicate scans share a blob, so decode and predict each hash only once
+            hashes = [h for h in dict.fromkeys(row.image_sha256 for row in rows) if store.exists(h)]
+            missing += sum(1 for row in rows if not store.exists(row.image_sha256))
+            if not hashes:
+                continue
+
+            decoded = {}
+            for h, image in zip(hashes, pool.map(lambda h: load_scan(store, h), hashes)):
+                if image is None:
+                    unreadable += 1
+                else:
+                    decoded[h] = image
+            if not decoded:
+                continue
+
+            preds = model.predict(np.stack(list(decoded.values())), batch_size=batch_size, verbose=0)
+            results = dict(zip(decoded, decode_predictions(preds)))
+
+            for row in rows:
+                if row.image_sha256 not in results:
+                    continue
+                label, confidence = results[row.image_sha256]
+                db.add(models.PredictionRescore(
+                    prediction_id=row.id,
+                    model_version=version,
+                    label=label,
+                    confidence=confidence,
+                ))
+                scored += 1
+                agreed += label == row.label
+            db.commit()
+            print(f"[INFO] {scored} predictions re-scored (up to id {last_id})")
+    finally:
+        pool.shutdown()
+        db.close()
+
+    if scored:
+        print(f"[INFO] agreement with original labels: {agreed}/{scored} ({agreed / scored:.1%})")
+    if missing:
+        print(f"[WARN] {missing} predictions reference scans missing from the store")
+    if unreadable:
+        print(f"[WARN] {unreadable} archived scans could not be read or decoded")
+    return scored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score archived scans under a chosen model.")
+    parser.add_argument("--model", required=True, help="saved Keras model to score with")
+    parser.add_argument("--version", help="label stored with the results (default: name + content hash)")
+    parser.add_argument("--store", default=os.getenv("PARKINSONS_SCAN_STORE", os.path.join(BASE_DIR, "scan_store")))
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4, help="threads decoding scans from disk")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine)
+    database.add_missing_columns()
+    rescore(args.model, BlobStore(args.store), args.version, args.batch_size, args.workers)
@@ -0,0 +1,135 @@
+# backend/tune.py
+"""
+Find the fastest CPU serving configuration for the deployed model.
+
+    python -m backend.tune --model model/parkinsons_detector.keras
+
+Sweeps TensorFlow intra/inter-op thread counts, batch sizes and call style
+(`model.predict`, `model(x, training=False)`, or a `tf.function` with a fixed
+input signature). Thread counts can only be set before TensorFlow starts, so
+each thread setting is measured in its own subprocess. The winner is written
+to the serving profile, which backend/main.py and backend/inference_server.py
+apply at startup.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .inference import CALL_STYLES, IMG_SIZE, configure_threads, make_predict_fn, model_version
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL = os.path.join(BASE_DIR, "model", "parkinsons_detector.keras")
+DEFAULT_PROFILE = os.path.join(BASE_DIR, "model", "serving_profile.json")
+
+
+def measure(model_path, intra, inter, batch_sizes, runs):
+    """Time every call style and batch size under one thread setting (runs in a subprocess)."""
+    configure_threads(intra, inter)
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path)
+
+    results = []
+    for style in CALL_STYLES:
+        predict_fn = make_predict_fn(model, style)
+        for batch_size in batch_sizes:
+            batch = np.random.rand(batch_size, IMG_SIZE[1], IMG_SIZE[0], 3).astype("float32")
+            predict_fn(batch)  # warm-up / tracing
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                predict_fn(batch)
+                timings.append(time.perf_counter() - start)
+            latency = float(np.median(timings)) * 1000
+            results.append({
+                "intra_op_threads": intra,
+                "inter_op_threads": inter,
+                "call_style": style,
+                "batch_size": batch_size,
+                "latency_ms": round(latency, 2),
+                "ms_per_image": round(latency / batch_size, 2),
+            })
+    return results
+
+
+def thread_counts():
+    cores = os.cpu_count() or 1
+    counts = {1, cores}
+    n = 2
+    while n < cores:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def sweep(model_path, batch_sizes, runs, intra_values, inter_values):
+    results = []
+    for intra in intra_values:
+        for inter in inter_values:
+            print(f"[INFO] measuring intra_op={intra} inter_op={inter}...")
+            proc = subprocess.run(
+                [sys.executable, "-m", "backend.tune", "--worker", "--model", os.path.abspath(model_path),
+                 "--intra", str(intra), "--inter", str(inter), "--runs", str(runs),
+                 "--batch-sizes", ",".join(map(str, batch_sizes))],
+                cwd=BASE_DIR, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"[WARN] run failed:\n{proc.stderr[-2000:]}")
+                continue
+            # The worker's JSON is its last line of output; TensorFlow may log before it
+            results.extend(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def pick_profile(results, model_path):
+    # The API serves one scan per request, so threads and call style are picked on batch-1
+    # latency; the best batch size under that setting sizes the inference server's batches.
+    single = [r for r in results if r["batch_size"] == 1] or results
+    best = min(single, key=lambda r: r["ms_per_image"])
+    same_setup = [r for r in results if all(r[k] == best[k] for k in
+                                            ("intra_op_threads", "inter_op_threads", "call_style"))]
+    best_batch = min(same_setup, key=lambda r: r["ms_per_image"])
+    return {
+        "model_version": model_version(model_path),
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": best["inter_op_threads"],
+        "call_style": best["call_style"],
+        "latency_ms": best["latency_ms"],
+        "max_batch": best_batch["batch_size"],
+        "ms_per_image_at_max_batch": best_batch["ms_per_image"],
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune CPU inference settings and write a serving profile.")
+    parser.add_argument("--model", default=os.getenv("PARKINSONS_MODEL_PATH", DEFAULT_MODEL))
+    parser.add_argument("--output", default=os.getenv("PARKINSONS_SERVING_PROFILE", DEFAULT_PROFILE))
+    parser.add_argument("--batch-sizes", default="1,4,8,16")
+    parser.add_argument("--runs", type=int, default=20, help="timed calls per configuration")
+    parser.add_argument("--intra", type=int, help="only try this intra-op thread count")
+    parser.add_argument("--inter", type=int, help="only try this inter-op thread count")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    if args.worker:
+        print(json.dumps(measure(args.model, args.intra, args.inter, batch_sizes, args.runs)))
+        sys.exit(0)
+
+    intra_values = [args.intra] if args.intra is not None else thread_counts()
+    inter_values = [args.inter] if args.inter is not None else [1, 2]
+    results = sweep(args.model, batch_sizes, args.runs, intra_values, inter_values)
+    if not results:
+        sys.exit("[ERROR] no configuration could be measured")
+
+    profile = pick_profile(results, args.model)
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"[INFO] fastest: intra_op={profile['intra_op_threads']} inter_op={profile['inter_op_threads']} "
+          f"call_style={profile['call_style']} ({profile['latency_ms']} ms/scan), "
+          f"best batch {profile['max_batch']}")
+    print(f"[INFO] serving profile written to {args.output}")
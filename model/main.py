@@ -1,4 +1,8 @@
 import os
+import time
+import argparse
+import cProfile
+import shutil
 import cv2
 import numpy as np
 import pandas as pd
@@ -9,22 +13,40 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 import tensorflow as tf
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.applications import VGG16
-from tensorflow.keras.layers import AveragePooling2D, Dropout, Flatten, Dense, Input
+from tensorflow.keras.applications import VGG16, MobileNetV3Small, EfficientNetB0
+from tensorflow.keras.layers import AveragePooling2D, GlobalAveragePooling2D, Dropout, Flatten, Dense, Input, Rescaling
 from tensorflow.keras.models import Model
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.utils import to_categorical
 import os 
 
 # --- CONFIGURATION ---
-# UPDATE THIS PATH to match the folder name you uploaded
-# For example, if your folder is named 'dataset', change this to 'dataset'
-DATASET_PATH = r"C:\Users\hp\OneDrive\Desktop\Parkinson-s-Disease-Classifier-master(Final)\Parkinson-s-Disease-Classifier-master\Parkinson-s-Disease-Classifier-master\dataset"
+# The repo's dataset/ folder: train/ is used for training (with a validation split),
+# test/ is held out for --benchmark
+DATASET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dataset")
 
 INIT_LR = 1e-4
 EPOCHS = 50  # Reduced for testing; increase to 50 or 100 for final training
 BS = 8
 
+# Backbones that build_model() knows about. "vgg16" is the original serving model;
+# the compact ones are much cheaper on CPU-only hosts.
+BACKBONES = ["vgg16", "mobilenetv3", "efficientnetb0"]
+
+# Knowledge distillation settings (only used with --teacher)
+DISTILL_ALPHA = 0.5       # weight of the hard-label loss vs. the teacher's soft targets
+DISTILL_TEMPERATURE = 4.0
+
+# Early stopping / checkpointing
+PATIENCE = 8            # epochs without val_loss improvement before stopping
+CHECKPOINT_EVERY = 5    # epochs between checkpoints
+CHECKPOINTS_KEPT = 3
+
+MODEL_DIR = "model"
+CHECKPOINT_DIR = os.path.join("model", "checkpoints")
+# Same folder the backend's /admin/profiles serves from
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles")
+
 
 def load_data(dataset_path):
     print(f"[INFO] loading images from {dataset_path}...")
@@ -54,21 +76,44 @@ def load_data(dataset_path):
     return data, labels
 
 
-def build_model():
-    print("[INFO] compiling model...")
-    # Load VGG16 network, ensuring the head FC layer sets are left off
-    baseModel = VGG16(weights="imagenet", include_top=False, input_tensor=Input(shape=(224, 224, 3)))
+def build_base(backbone, input_tensor):
+    """Return the frozen, ImageNet-pretrained feature extractor for `backbone`.
+
+    Every model takes the same [0, 1] scaled 224x224 RGB input, so the backend can serve
+    any of them without changing its preprocessing. MobileNetV3 and EfficientNet ship
+    their own preprocessing that expects [0, 255], so we scale back up inside the graph.
+    """
+    if backbone == "vgg16":
+        return VGG16(weights="imagenet", include_top=False, input_tensor=input_tensor)
+
+    scaled = Rescaling(255.0, name="rescale_to_255")(input_tensor)
+    if backbone == "mobilenetv3":
+        return MobileNetV3Small(weights="imagenet", include_top=False, input_tensor=scaled,
+                                include_preprocessing=True)
+    if backbone == "efficientnetb0":
+        return EfficientNetB0(weights="imagenet", include_top=False, input_tensor=scaled)
+    raise ValueError(f"Unknown backbone '{backbone}'. Choose one of {BACKBONES}.")
+
+
+def build_model(backbone="vgg16"):
+    print(f"[INFO] compiling model ({backbone})...")
+    inputs = Input(shape=(224, 224, 3))
+    # Load the backbone network, ensuring the head FC layer sets are left off
+    baseModel = build_base(backbone, inputs)
 
     # Construct the head of the model that will be placed on top of the base
     headModel = baseModel.output
-    headModel = AveragePooling2D(pool_size=(4, 4))(headModel)
-    headModel = Flatten(name="flatten")(headModel)
+    if backbone == "vgg16":
+        headModel = AveragePooling2D(pool_size=(4, 4))(headModel)
+        headModel = Flatten(name="flatten")(headModel)
+    else:
+        headModel = GlobalAveragePooling2D(name="gap")(headModel)
     headModel = Dense(64, activation="relu")(headModel)
     headModel = Dropout(0.5)(headModel)
     headModel = Dense(2, activation="softmax")(headModel)  # Assuming 2 classes: Healthy vs Parkinson's
 
     # Place the head FC model on top of the base model
-    model = Model(inputs=baseModel.input, outputs=headModel)
+    model = Model(inputs=inputs, outputs=headModel, name=f"parkinsons_{backbone}")
 
     # Loop over all layers in the base model and freeze them so they will not be updated
     for layer in baseModel.layers:
@@ -79,14 +124,195 @@ def build_model():
     return model
 
 
-def plot_history(H, epochs):
+class Distiller(Model):
+    """Trains a compact `student` to match both the labels and a frozen `teacher`.
+
+    Only the student is saved afterwards, so the served model is an ordinary
+    Keras model with the same input/output contract as the teacher.
+    """
+
+    def __init__(self, student, teacher, alpha=DISTILL_ALPHA, temperature=DISTILL_TEMPERATURE):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.teacher.trainable = False
+        self.alpha = alpha
+        self.temperature = temperature
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        self.acc_tracker = tf.keras.metrics.CategoricalAccuracy(name="accuracy")
+        self.kl_divergence = tf.keras.losses.KLDivergence()
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.acc_tracker]
+
+    def call(self, x, training=False):
+        return self.student(x, training=training)
+
+    def _soften(self, probs):
+        # Both networks end in softmax, so re-soften from log-probabilities
+        return tf.nn.softmax(tf.math.log(probs + 1e-7) / self.temperature)
+
+    def train_step(self, data):
+        x, y = data
+        teacher_probs = self.teacher(x, training=False)
+        with tf.GradientTape() as tape:
+            student_probs = self.student(x, training=True)
+            hard_loss = tf.reduce_mean(tf.keras.losses.categorical_crossentropy(y, student_probs))
+            soft_loss = self.kl_divergence(self._soften(teacher_probs), self._soften(student_probs))
+            loss = self.alpha * hard_loss + (1 - self.alpha) * soft_loss * self.temperature ** 2
+
+        grads = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(grads, self.student.trainable_variables))
+
+        self.loss_tracker.update_state(loss)
+        self.acc_tracker.update_state(y, student_probs)
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        x, y = data
+        student_probs = self.student(x, training=False)
+        loss = tf.reduce_mean(tf.keras.losses.categorical_crossentropy(y, student_probs))
+        self.loss_tracker.update_state(loss)
+        self.acc_tracker.update_state(y, student_probs)
+        return {m.name: m.result() for m in self.metrics}
+
+
+def default_output_path(backbone):
+    if backbone == "vgg16":
+        return os.path.join(MODEL_DIR, "parkinsons_detector.keras")
+    return os.path.join(MODEL_DIR, f"parkinsons_detector_{backbone}.keras")
+
+
+def benchmark(model_paths, test_path, runs=50):
+    """Print (and save) a latency / size / accuracy table for the given saved models."""
+    data, labels = load_data(test_path)
+    y_true = LabelEncoder().fit_transform(labels)
+    data = data.astype("float32")
+    single = data[:1]
+
+    rows = []
+    for path in model_paths:
+        print(f"[INFO] benchmarking {path}...")
+        model = tf.keras.models.load_model(path)
+
+        # Warm up once so graph tracing isn't counted as latency
+        model(single, training=False)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model(single, training=False)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        preds = model.predict(data, batch_size=BS, verbose=0)
+        accuracy = float(np.mean(np.argmax(preds, axis=1) == y_true))
+
+        rows.append({
+            "model": os.path.basename(path),
+            "params_M": round(model.count_params() / 1e6, 2),
+            "size_MB": round(os.path.getsize(path) / 1e6, 1),
+            "latency_p50_ms": round(float(np.percentile(timings, 50)), 1),
+            "latency_p95_ms": round(float(np.percentile(timings, 95)), 1),
+            "test_accuracy": round(accuracy, 4),
+        })
+
+    table = pd.DataFrame(rows)
+    print(table.to_string(index=False))
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    table.to_csv(os.path.join(MODEL_DIR, "benchmark.csv"), index=False)
+    return table
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Logs how long each epoch took (also added to the logs, so CSVLogger records it)."""
+
+    def on_train_begin(self, logs=None):
+        self.total = 0.0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.start
+        self.total += elapsed
+        if logs is not None:
+            logs["epoch_time"] = elapsed
+        print(f"[INFO] epoch {epoch + 1} took {elapsed:.1f}s")
+
+    def on_train_end(self, logs=None):
+        print(f"[INFO] total training time: {self.total / 60:.1f} min")
+
+
+class ResumableEarlyStopping(tf.keras.callbacks.EarlyStopping):
+    """
+    EarlyStopping whose progress survives --resume. The best val_loss, the patience
+    counter and the best epoch are kept in variables that go into the training
+    checkpoint, and the best weights get their own checkpoint (`best_manager`).
+    """
+
+    def __init__(self, best_manager, **kwargs):
+        super().__init__(**kwargs)
+        self.best_manager = best_manager
+        self.best_var = tf.Variable(np.inf, dtype=tf.float64, trainable=False)
+        self.wait_var = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.best_epoch_var = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.resumed = False
+
+    def on_train_begin(self, logs=None):
+        super().on_train_begin(logs)
+        if not self.resumed:
+            return
+        self.best = float(self.best_var.numpy())
+        self.wait = int(self.wait_var.numpy())
+        self.best_epoch = int(self.best_epoch_var.numpy())
+        if self.restore_best_weights and self.best_manager.latest_checkpoint:
+            # Load the best weights just long enough to copy them into the callback
+            current = self.model.get_weights()
+            self.best_manager.checkpoint.restore(self.best_manager.latest_checkpoint).expect_partial()
+            self.best_weights = self.model.get_weights()
+            self.model.set_weights(current)
+
+    def on_epoch_end(self, epoch, logs=None):
+        previous_best = self.best
+        super().on_epoch_end(epoch, logs)
+        if self.best != previous_best:
+            self.best_manager.save()
+        self.best_var.assign(self.best)
+        self.wait_var.assign(self.wait)
+        self.best_epoch_var.assign(self.best_epoch)
+
+
+class PeriodicCheckpoint(tf.keras.callbacks.Callback):
+    """Saves model + optimizer state (and the epoch reached) every `every` epochs."""
+
+    def __init__(self, manager, epoch_var, every=CHECKPOINT_EVERY, initial_epoch=0):
+        super().__init__()
+        self.manager = manager
+        self.epoch_var = epoch_var
+        self.every = every
+        self.epochs_done = initial_epoch
+
+    def save(self, epochs_done):
+        self.epoch_var.assign(epochs_done)
+        path = self.manager.save()
+        print(f"[INFO] checkpoint saved to {path} (epoch {epochs_done})")
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epochs_done = epoch + 1
+        if (epoch + 1) % self.every == 0:
+            self.save(epoch + 1)
+
+
+def plot_history(H, initial_epoch=0):
     print("[INFO] plotting training history...")
+    # Early stopping / resuming means this isn't always 0..EPOCHS
+    epochs = np.arange(initial_epoch, initial_epoch + len(H.history["loss"]))
     plt.style.use("ggplot")
     plt.figure()
-    plt.plot(np.arange(0, epochs), H.history["loss"], label="train_loss")
-    plt.plot(np.arange(0, epochs), H.history["val_loss"], label="val_loss")
-    plt.plot(np.arange(0, epochs), H.history["accuracy"], label="train_acc")
-    plt.plot(np.arange(0, epochs), H.history["val_accuracy"], label="val_acc")
+    plt.plot(epochs, H.history["loss"], label="train_loss")
+    plt.plot(epochs, H.history["val_loss"], label="val_loss")
+    plt.plot(epochs, H.history["accuracy"], label="train_acc")
+    plt.plot(epochs, H.history["val_accuracy"], label="val_acc")
     plt.title("Training Loss and Accuracy")
     plt.xlabel("Epoch #")
     plt.ylabel("Loss/Accuracy")
@@ -95,10 +321,33 @@ def plot_history(H, epochs):
     plt.show()  # Opens a window with the graph
 
 
-if __name__ == "__main__":
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train or benchmark the Parkinson's spiral/wave classifier.")
+    parser.add_argument("--dataset", default=DATASET_PATH,
+                        help="folder with train/ and test/, each with one sub-folder per class")
+    parser.add_argument("--backbone", choices=BACKBONES, default="vgg16")
+    parser.add_argument("--teacher", help="saved model to distill from (e.g. the VGG16 detector)")
+    parser.add_argument("--output", help="where to save the trained model (default depends on backbone)")
+    parser.add_argument("--benchmark", nargs="+", metavar="MODEL",
+                        help="skip training and compare these saved models on the test set")
+    parser.add_argument("--test-dataset", help="test folder for --benchmark (default: <dataset>/test)")
+    parser.add_argument("--profile", choices=["cprofile", "tensorflow"],
+                        help="capture a profile of the training loop into profiles/")
+    parser.add_argument("--profile-batches", default="5,10",
+                        help="first,last batch traced by the TensorFlow profiler")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the latest checkpoint in model/checkpoints/<backbone>")
+    parser.add_argument("--patience", type=int, default=PATIENCE,
+                        help="stop after this many epochs without val_loss improvement")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY)
+    return parser.parse_args()
+
+
+def train(args):
     # 1. Load Data
     try:
-        data, labels = load_data(DATASET_PATH)
+        # Only train/ -- test/ stays unseen so the benchmark accuracy is honest
+        data, labels = load_data(os.path.join(args.dataset, "train"))
     except Exception as e:
         print(e)
         exit()
@@ -123,15 +372,84 @@ if __name__ == "__main__":
         fill_mode="nearest")
 
     # 5. Build and Train Model
-    model = build_model()
+    model = build_model(args.backbone)
+    trainer = model
+    if args.teacher:
+        print(f"[INFO] distilling from {args.teacher}...")
+        teacher = tf.keras.models.load_model(args.teacher)
+        trainer = Distiller(student=model, teacher=teacher)
+        trainer.compile(optimizer=Adam(learning_rate=INIT_LR))
+
+    # Checkpoints hold the served model, the optimizer and early-stopping state, so training
+    # can resume exactly; the best weights so far are kept in a checkpoint of their own
+    checkpoint_dir = os.path.join(CHECKPOINT_DIR, args.backbone)
+    best_manager = tf.train.CheckpointManager(
+        tf.train.Checkpoint(model=model), os.path.join(checkpoint_dir, "best"), max_to_keep=1)
+    early_stopping = ResumableEarlyStopping(best_manager, monitor="val_loss", patience=args.patience,
+                                            restore_best_weights=True, verbose=1)
+
+    epoch_var = tf.Variable(0, dtype=tf.int64, trainable=False)
+    trainer.optimizer.build(model.trainable_variables)
+    checkpoint = tf.train.Checkpoint(model=model, optimizer=trainer.optimizer, epoch=epoch_var,
+                                     early_stopping_best=early_stopping.best_var,
+                                     early_stopping_wait=early_stopping.wait_var,
+                                     early_stopping_best_epoch=early_stopping.best_epoch_var)
+    manager = tf.train.CheckpointManager(checkpoint, checkpoint_dir, max_to_keep=CHECKPOINTS_KEPT)
+    initial_epoch = 0
+    if args.resume:
+        if manager.latest_checkpoint:
+            checkpoint.restore(manager.latest_checkpoint)
+            initial_epoch = int(epoch_var.numpy())
+            early_stopping.resumed = True
+            print(f"[INFO] resumed from {manager.latest_checkpoint} at epoch {initial_epoch}")
+        else:
+            print("[INFO] no checkpoint found, starting from scratch")
+
+    checkpointer = PeriodicCheckpoint(manager, epoch_var, args.checkpoint_every, initial_epoch)
+    callbacks = [
+        EpochTimer(),
+        tf.keras.callbacks.CSVLogger(os.path.join(MODEL_DIR, f"training_log_{args.backbone}.csv"),
+                                     append=args.resume),
+        early_stopping,  # must run before checkpointer so its state is current when saved
+        checkpointer,
+    ]
+    profile = None
+    run_name = time.strftime("train-%Y%m%d-%H%M%S")
+    if args.profile == "tensorflow":
+        first, last = (int(b) for b in args.profile_batches.split(","))
+        callbacks.append(tf.keras.callbacks.TensorBoard(
+            log_dir=os.path.join(PROFILE_DIR, run_name), profile_batch=(first, last)))
+    elif args.profile == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
 
     print("[INFO] training head...")
-    H = model.fit(
-        aug.flow(trainX, trainY, batch_size=BS),
-        steps_per_epoch=len(trainX) // BS,
-        validation_data=(testX, testY),
-        validation_steps=len(testX) // BS,
-        epochs=EPOCHS)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    try:
+        H = trainer.fit(
+            aug.flow(trainX, trainY, batch_size=BS),
+            steps_per_epoch=len(trainX) // BS,
+            validation_data=(testX, testY),
+            validation_steps=len(testX) // BS,
+            initial_epoch=initial_epoch,
+            epochs=EPOCHS,
+            callbacks=callbacks)
+    except KeyboardInterrupt:
+        # Keep the work done so far; rerun with --resume to carry on
+        checkpointer.save(checkpointer.epochs_done)
+        raise
+
+    if profile is not None:
+        profile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(PROFILE_DIR, run_name + ".prof"))
+        print(f"[INFO] training profile written to {PROFILE_DIR}/{run_name}.prof")
+    elif args.profile == "tensorflow":
+        # Zip the trace like the backend does so /admin/profiles lists and rotates it
+        trace_dir = os.path.join(PROFILE_DIR, run_name)
+        shutil.make_archive(trace_dir, "zip", trace_dir)
+        shutil.rmtree(trace_dir, ignore_errors=True)
+        print(f"[INFO] training trace written to {trace_dir}.zip")
 
     # 6. Evaluate
     print("[INFO] evaluating network...")
@@ -142,14 +460,18 @@ if __name__ == "__main__":
                                 target_names=lb.classes_))
 
     # 7. Save Model and Plot
-    print("[INFO] saving model...")
-    # model.save("parkinsons_detector.model")
-
-    os.makedirs("model", exist_ok=True)
-    # model.save("model/parkinsons_detector.model")
+    output = args.output or default_output_path(args.backbone)
+    print(f"[INFO] saving model to {output}...")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    model.save(output)
 
-    model.save("model/parkinsons_detector.keras")
+    plot_history(H, initial_epoch)
+    print(f"Done! Check '{output}' and 'plot.png' in your project folder.")
 
 
-    plot_history(H, EPOCHS)
-    print("Done! Check 'parkinsons_detector.model' and 'plot.png' in your project folder.")
\ No newline at end of file
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark, args.test_dataset or os.path.join(args.dataset, "test"))
+    else:
+        train(args)
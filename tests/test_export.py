@@ -0,0 +1,64 @@
+import csv
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend import database, export, models
+
+
+@pytest.fixture
+def db_engine(tmp_path, monkeypatch):
+    # Short busy timeout so a lock shows up as a failure instead of a long hang
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}",
+                           connect_args={"check_same_thread": False, "timeout": 1})
+    models.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(database, "engine", engine)
+    return engine
+
+
+def add_predictions(session, user, n):
+    session.add_all([
+        models.Prediction(user_id=user.id, patient_name=f"p{i}", patient_age=50,
+                          filename=f"{i}.png", label="Healthy", confidence=90.0)
+        for i in range(n)
+    ])
+    session.commit()
+
+
+def test_writes_are_not_blocked_during_export(db_engine):
+    Session = sessionmaker(bind=db_engine)
+    session = Session()
+    user = models.User(username="doc", password_hash="x", role="doctor")
+    session.add(user)
+    session.commit()
+    add_predictions(session, user, 5000)
+
+    stream = export.stream_csv(export.build_query(), chunk_size=1000)
+    sent = [next(stream), next(stream)]
+
+    # A /predict-style write while the export is still being downloaded
+    add_predictions(session, user, 1)
+    session.close()
+
+    body = b"".join(sent + list(stream)).decode()
+    rows = list(csv.DictReader(io.StringIO(body)))
+    # Keyset paging picks up the row written mid-export, without duplicates
+    assert len(rows) == 5001
+    assert len({row["id"] for row in rows}) == 5001
+
+
+def test_export_filters_by_doctor(db_engine):
+    session = sessionmaker(bind=db_engine)()
+    alice = models.User(username="alice", password_hash="x", role="doctor")
+    bob = models.User(username="bob", password_hash="x", role="doctor")
+    session.add_all([alice, bob])
+    session.commit()
+    add_predictions(session, alice, 3)
+    add_predictions(session, bob, 2)
+    session.close()
+
+    body = b"".join(export.stream_csv(export.build_query(doctor="bob"), chunk_size=1)).decode()
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert [row["doctor"] for row in rows] == ["bob", "bob"]
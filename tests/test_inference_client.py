@@ -0,0 +1,64 @@
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend.inference import RemoteModel, recv_message, send_array, send_message
+from backend.inference_server import InferenceServer
+
+
+def start_server(path, predict_fn):
+    server = InferenceServer(str(path), predict_fn, "test-1", max_wait_ms=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_reconnects_once_when_connection_went_stale(tmp_path):
+    path = str(tmp_path / "inference.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    received = []
+
+    def fake_server():
+        # First connection answers "info", then dies without replying, like a restart
+        conn, _ = listener.accept()
+        recv_message(conn)
+        send_message(conn, {"ok": True, "model_version": "test-1"})
+        received.append(recv_message(conn)[0]["op"])
+        conn.close()
+        conn, _ = listener.accept()
+        received.append(recv_message(conn)[0]["op"])
+        send_array(conn, {"ok": True}, np.ones((1, 2), "float32"))
+        conn.close()
+
+    thread = threading.Thread(target=fake_server, daemon=True)
+    thread.start()
+    model = RemoteModel(path)
+    assert model.predict(np.zeros((1, 2), "float32")).tolist() == [[1.0, 1.0]]
+    thread.join(timeout=5)
+    listener.close()
+    assert received == ["predict", "predict"]
+
+
+def test_timeout_is_not_retried(tmp_path):
+    calls = []
+
+    def slow(x):
+        calls.append(len(x))
+        time.sleep(0.5)
+        return np.zeros((len(x), 2), "float32")
+
+    path = tmp_path / "inference.sock"
+    server = start_server(path, slow)
+    try:
+        model = RemoteModel(str(path), timeout=0.2)
+        with pytest.raises(TimeoutError):
+            model.predict(np.zeros((1, 2), "float32"))
+        time.sleep(0.6)
+        assert calls == [1]
+    finally:
+        server.shutdown()
+        server.server_close()